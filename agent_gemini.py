@@ -1,4 +1,7 @@
 import google.generativeai as genai
+from google.protobuf import json_format
+import asyncio
+import functools
 import json
 import logging
 from typing import List, Dict, Any, Optional
@@ -7,9 +10,15 @@ import calendar # For month name to number mapping
 import re # For simple parsing
 
 
-from db_tools import search_federal_documents 
+from db_tools import SearchResult, search_federal_documents, search_federal_documents_batch
 from config import GOOGLE_API_KEY
 
+try: # Optional: enables semantic (Semantic-k) history selection
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 if not GOOGLE_API_KEY:
@@ -17,6 +26,37 @@ if not GOOGLE_API_KEY:
 genai.configure(api_key=GOOGLE_API_KEY)
 
 GEMINI_MODEL_NAME = "gemini-2.0-flash-001" # or "gemini-1.0-pro"
+CONDENSER_MODEL_NAME = "gemini-2.0-flash-lite-001" # Cheaper model used only to summarize old turns
+
+# --- History condensation ---
+HISTORY_TOKEN_BUDGET = 6000 # Condense once the history sent per turn grows past this
+KEEP_RECENT_MESSAGES = 6 # Most recent messages always kept verbatim
+CHARS_PER_TOKEN_ESTIMATE = 4 # Rough bytes-per-token estimate used to skip the count_tokens call on short histories
+SUMMARY_PREFIX = "[Prior conversation summary]: "
+CONDENSER_PROMPT = (
+    "Summarize the prior dialogue between a user and an assistant that searches U.S. Federal Register documents. "
+    "Preserve the user's goals, entities (agencies, topics, document types), dates and date ranges, "
+    "and the tool findings (document titles, publication dates, URLs) the assistant reported. "
+    "Be concise and factual.\n\n"
+)
+
+# --- Semantic history selection ---
+# Older exchanges are ranked by embedding similarity to the new query; only the top K of
+# them plus the most recent exchanges are sent. Without sentence-transformers installed the
+# full history is sent.
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_HISTORY_TOP_K = 3
+SEMANTIC_HISTORY_KEEP_RECENT = 2
+
+# --- Tool results kept in history ---
+# Once a turn is answered, search results stored in the history are cut down to these
+# fields for at most this many documents; later turns rarely need abstracts again.
+HISTORY_TOOL_RESULT_FIELDS = ("title", "publication_date", "html_url")
+HISTORY_TOOL_RESULT_MAX_DOCS = 5
+
+# --- Tool results sent to the model ---
+TOOL_RESULT_FIELDS = ("title", "publication_date", "agency_name", "html_url", "abstract")
+TOOL_RESULT_ABSTRACT_CHARS = 300 # Abstracts dominate the payload; the model only needs the gist
 
 # --- Tool Definition (largely the same, but ensure descriptions are clear) ---
 search_tool_declaration = genai.protos.Tool(
@@ -51,19 +91,69 @@ available_tools = {
     "search_federal_documents": search_federal_documents 
 }
 
+# --- System Instructions ---
+# "{today}" is filled in by get_model(); the rest of the prompt is built once at import.
+SYSTEM_INSTRUCTION_TEMPLATE = (
+    "You are an AI assistant expert at searching and explaining U.S. Federal Register documents using the 'search_federal_documents' tool. "
+    "Your goal is to understand the user's cumulative request over the conversation, make an informed tool call, and then present the findings clearly. "
+    "1. **Aggregate Information:** Combine information from the entire conversation for tool calls. "
+    "2. **Proactive Tool Use:** Use the tool if you have enough information (e.g., keywords). Not all parameters need to be filled. "
+    "3. **Date Calculation:** If relative dates ('this month', 'April 2025') are mentioned, calculate 'start_date' and 'end_date' (YYYY-MM-DD). Today's date is {today}. "
+    "4. **Document Type Logic (IMPORTANT REVISION):** "
+    "    a. If the user *explicitly asks for 'executive orders'*, then you MUST use 'Presidential Document' as the 'document_type' for the tool and can mention this. "
+    "    b. If the user asks for 'presidential documents' generally, also use 'Presidential Document' as the 'document_type'. "
+    "    c. If the user asks for 'executive documents' (more general than 'executive orders' or 'presidential documents'), or if they just provide keywords (e.g., 'documents on security') without specifying a clear type like 'rule' or 'notice', it's often best to **NOT specify a 'document_type' parameter at all** in your first tool call. This will allow the search to be broader across all document types. You can then suggest filtering by type if too many results are found. "
+    "    d. If the user specifies a different type like 'Rule', 'Notice', etc., use that exact type. "
+    "5. **Information Presentation and Explanation:** After the tool returns documents: "
+    "    a. Provide an overall summary. "
+    "    b. For key documents: list Title, Publication Date, Agency, a brief explanation of relevance from its abstract, and the HTML URL. "
+    "    c. Use clear formatting (e.g., bullet points). "
+    "6. **Handling No Results/Errors:** If no documents are found, clearly inform the user what search parameters you used (e.g., 'I searched for documents with keywords X and type Y but found nothing.'). Suggest broadening the search (e.g., removing a type filter, changing keywords, or adjusting dates). "
+    "7. **Clarification (If Truly Necessary):** Only if the request is extremely vague after several turns, ask for specific clarification. "
+    "8. **Default Search with Keywords:** If only keywords are provided (e.g., 'artificial intelligence and security'), use those keywords for the tool call without necessarily needing a document_type or date. "
+)
+
+@functools.lru_cache(maxsize=1)
+def get_model(today: str) -> genai.GenerativeModel:
+    """
+    Returns the tool-enabled model for the given date (YYYY-MM-DD).
+    Cached so the model and its serialized tool declaration are built once per day, not per turn.
+    """
+    return genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        tools=[search_tool_declaration],
+        system_instruction=SYSTEM_INSTRUCTION_TEMPLATE.format(today=today)
+    )
+
+# Month lookup tables, built once at import
+MONTH_MAP = {
+    **{name.lower(): num for num, name in enumerate(calendar.month_name) if num},
+    **{str(num): num for num in range(1, 13)},
+    **{f"{num:02d}": num for num in range(1, 13)},
+}
+MONTH_ABBR_MAP = {abbr.lower(): num for num, abbr in enumerate(calendar.month_abbr) if num}
+# A whole word starting with a month abbreviation: "sept", "March 2025", "in dec" ...
+MONTH_WORD_RE = re.compile(r"\b(" + "|".join(MONTH_ABBR_MAP) + r")[a-z]*\b")
+MONTH_NUMBER_RE = re.compile(r"\b(1[0-2]|0?[1-9])\b")
+
+@functools.lru_cache(maxsize=256)
+def parse_month(month_str: str) -> Optional[int]:
+    """Maps a month name, abbreviation or number (possibly embedded in text) to 1-12, or None."""
+    month_key = month_str.strip().lower()
+    if month_key in MONTH_MAP: return MONTH_MAP[month_key]
+    for match in MONTH_WORD_RE.finditer(month_key):
+        # Only prefixes of the month name count, so "junk" or "decade" is not a month
+        month = MONTH_ABBR_MAP[match.group(1)]
+        if calendar.month_name[month].lower().startswith(match.group(0)): return month
+    match = MONTH_NUMBER_RE.search(month_key)
+    if match: return int(match.group(1))
+    return None
+
 def get_date_range_for_month(year_str: str, month_str: str) -> tuple[Optional[str], Optional[str]]:
-    # ... (same helper function as before) ...
+    # Only month parsing is memoized: the end date is clipped to today, so the range itself can't be cached
     try:
         year = int(year_str)
-        month_map = {name.lower(): num for num, name in enumerate(calendar.month_name) if num}
-        month_map.update({str(num): num for num in range(1, 13)})
-        month_map.update({f"{num:02d}": num for num in range(1, 13)})
-        month = None
-        if month_str.lower() in month_map: month = month_map[month_str.lower()]
-        elif month_str.isdigit() and 1 <= int(month_str) <= 12: month = int(month_str)
-        else:
-            for m_name, m_num in month_map.items():
-                if m_name in month_str.lower(): month = m_num; break
+        month = parse_month(month_str)
         if month is None: return None, None
         start_date = datetime(year, month, 1)
         if month == 12: end_date = datetime(year, month, 31)
@@ -74,133 +164,340 @@ def get_date_range_for_month(year_str: str, month_str: str) -> tuple[Optional[st
     except ValueError: return None, None
 
 
-def get_gemini_response_with_tool_use(
+@functools.lru_cache(maxsize=1)
+def get_condenser_model() -> genai.GenerativeModel:
+    return genai.GenerativeModel(model_name=CONDENSER_MODEL_NAME)
+
+def _starts_user_turn(content: genai.protos.Content) -> bool:
+    """True for a user text message, i.e. the start of an exchange (not a function response)."""
+    return content.role == "user" and any(part.text for part in content.parts)
+
+def _render_transcript(history: List[genai.protos.Content]) -> str:
+    """Flattens history (including tool calls/results) into plain text for the condenser model."""
+    lines = []
+    for content in history:
+        for part in content.parts:
+            if part.text:
+                lines.append(f"{content.role}: {part.text}")
+            else:
+                lines.append(f"{content.role}: {json.dumps(type(part).to_dict(part), default=str)}")
+    return "\n".join(lines)
+
+async def condense_history(
+    history: List[genai.protos.Content],
+    max_tokens: int = HISTORY_TOKEN_BUDGET
+) -> List[genai.protos.Content]:
+    """
+    Returns `history` unchanged while it fits in `max_tokens`. Otherwise replaces everything
+    before the last KEEP_RECENT_MESSAGES messages with a single model-role summary message.
+    The cut is moved forward to the start of a user turn so tool calls stay paired with their
+    responses. On any error the original history is returned.
+    """
+    cut = len(history) - KEEP_RECENT_MESSAGES
+    while 0 < cut < len(history) and not _starts_user_turn(history[cut]):
+        cut += 1
+    if cut <= 0 or cut >= len(history):
+        return history
+
+    try:
+        # Serialized size also covers function call/response parts, which dominate tool-heavy turns
+        estimated_tokens = sum(genai.protos.Content.pb(content).ByteSize() for content in history) // CHARS_PER_TOKEN_ESTIMATE
+        if estimated_tokens < max_tokens // 2:
+            return history
+        model = get_model(datetime.now().strftime("%Y-%m-%d"))
+        total_tokens = (await model.count_tokens_async(history)).total_tokens
+        if total_tokens <= max_tokens:
+            return history
+
+        logging.info(f"History is {total_tokens} tokens (budget {max_tokens}); condensing {cut} oldest messages.")
+        summary_response = await get_condenser_model().generate_content_async(
+            CONDENSER_PROMPT + _render_transcript(history[:cut])
+        )
+        summary = summary_response.text
+    except Exception as e:
+        logging.error(f"Error condensing conversation history: {e}", exc_info=True)
+        return history
+
+    summary_content = genai.protos.Content(role="model", parts=[genai.protos.Part(text=SUMMARY_PREFIX + summary)])
+    return [summary_content] + list(history[cut:])
+
+
+def _search_result_payload(result: SearchResult) -> Dict[str, Any]:
+    """Serializes a SearchResult into a FunctionResponse payload with only the fields the model uses."""
+    if not result.ok:
+        return {"error": result.message}
+    if not result.rows:
+        return {"result": [], "message": result.message}
+    rows = []
+    for row in result.rows:
+        compact = {field: row[field] for field in TOOL_RESULT_FIELDS if row.get(field) is not None}
+        if "abstract" in compact:
+            compact["abstract"] = compact["abstract"][:TOOL_RESULT_ABSTRACT_CHARS]
+        rows.append(compact)
+    return {"result": rows}
+
+def _tool_result_payload(tool_response_data: Any) -> Dict[str, Any]:
+    if isinstance(tool_response_data, SearchResult):
+        return _search_result_payload(tool_response_data)
+    return {"result": tool_response_data}
+
+def _compact_function_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    rows = response.get("result")
+    if not isinstance(rows, list) or not rows:
+        return response # Errors and "no results" messages are already short
+    return {"result": [
+        {field: row[field] for field in HISTORY_TOOL_RESULT_FIELDS if field in row}
+        if isinstance(row, dict) else row
+        for row in rows[:HISTORY_TOOL_RESULT_MAX_DOCS]
+    ]}
+
+def redact_tool_events(history: List[genai.protos.Content]) -> List[genai.protos.Content]:
+    """Returns a copy of `history` with every FunctionResponse payload compacted for archiving."""
+    redacted = []
+    for content in history:
+        if not any(part.function_response.name for part in content.parts):
+            redacted.append(content)
+            continue
+        parts = []
+        for part in content.parts:
+            if part.function_response.name:
+                response = genai.protos.FunctionResponse.to_dict(part.function_response).get("response", {})
+                part = genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                    name=part.function_response.name,
+                    response=_compact_function_response(response)
+                ))
+            parts.append(part)
+        redacted.append(genai.protos.Content(role=content.role, parts=parts))
+    return redacted
+
+
+@functools.lru_cache(maxsize=1)
+def get_embedding_model() -> "SentenceTransformer":
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+@functools.lru_cache(maxsize=1024)
+def embed_text(text: str) -> "np.ndarray":
+    """Unit-length embedding of `text`; cached so each past exchange is only embedded once."""
+    return get_embedding_model().encode(text, normalize_embeddings=True)
+
+def select_relevant_history(
+    history: List[genai.protos.Content],
+    query: str,
+    top_k: int = SEMANTIC_HISTORY_TOP_K,
+    keep_recent: int = SEMANTIC_HISTORY_KEEP_RECENT
+) -> List[genai.protos.Content]:
+    """
+    Returns the subset of `history` worth sending with `query`: anything before the first
+    exchange (e.g. a condensation summary), the `top_k` older exchanges most similar to the
+    query, and the last `keep_recent` exchanges, in their original order. Exchanges are kept
+    whole so tool calls stay paired with their responses. Blocking; run it off the event loop.
+    """
+    if SentenceTransformer is None:
+        return history
+
+    preamble, exchanges = [], []
+    for content in history:
+        if _starts_user_turn(content):
+            exchanges.append([content])
+        elif exchanges:
+            exchanges[-1].append(content)
+        else:
+            preamble.append(content)
+
+    split = max(len(exchanges) - keep_recent, 0)
+    older, recent = exchanges[:split], exchanges[split:]
+    if len(older) <= top_k:
+        return history
+
+    older_embeddings = np.stack([
+        embed_text(" ".join(part.text for content in exchange for part in content.parts if part.text))
+        for exchange in older
+    ])
+    similarities = older_embeddings @ embed_text(query) # Cosine similarity, embeddings are unit length
+    selected = sorted(np.argsort(similarities)[-top_k:])
+    logging.info(f"Sending {len(selected)} of {len(older)} older exchanges plus the last {len(recent)}.")
+    return preamble + [content for index in selected for content in older[index]] + [content for exchange in recent for content in exchange]
+
+
+def start_chat_session(history: Optional[List[genai.protos.Content]] = None) -> genai.ChatSession:
+    """Starts a chat session; keep one per user conversation and pass it to every turn."""
+    return get_model(datetime.now().strftime("%Y-%m-%d")).start_chat(history=history or [])
+
+
+async def get_gemini_response_with_tool_use(
     user_query: str,
-    # Pass the existing conversation history for context
-    conversation_history: Optional[List[genai.protos.Content]] = None,
-    max_iterations: int = 3
+    # The caller's long-lived session; it accumulates the conversation across turns
+    chat: genai.ChatSession,
+    max_iterations: int = 3,
+    include_tool_events: bool = False,
+    history_top_k: Optional[int] = None
 ) -> str:
-    # --- System Instructions ---
-    system_instruction = (
-        "You are an AI assistant expert at searching and explaining U.S. Federal Register documents using the 'search_federal_documents' tool. "
-        "Your goal is to understand the user's cumulative request over the conversation, make an informed tool call, and then present the findings clearly. "
-        "1. **Aggregate Information:** Combine information from the entire conversation for tool calls. "
-        "2. **Proactive Tool Use:** Use the tool if you have enough information (e.g., keywords). Not all parameters need to be filled. "
-        "3. **Date Calculation:** If relative dates ('this month', 'April 2025') are mentioned, calculate 'start_date' and 'end_date' (YYYY-MM-DD). Today's date is " + datetime.now().strftime("%Y-%m-%d") + ". "
-        "4. **Document Type Logic (IMPORTANT REVISION):** "
-        "    a. If the user *explicitly asks for 'executive orders'*, then you MUST use 'Presidential Document' as the 'document_type' for the tool and can mention this. "
-        "    b. If the user asks for 'presidential documents' generally, also use 'Presidential Document' as the 'document_type'. "
-        "    c. If the user asks for 'executive documents' (more general than 'executive orders' or 'presidential documents'), or if they just provide keywords (e.g., 'documents on security') without specifying a clear type like 'rule' or 'notice', it's often best to **NOT specify a 'document_type' parameter at all** in your first tool call. This will allow the search to be broader across all document types. You can then suggest filtering by type if too many results are found. "
-        "    d. If the user specifies a different type like 'Rule', 'Notice', etc., use that exact type. "
-        "5. **Information Presentation and Explanation:** After the tool returns documents: "
-        "    a. Provide an overall summary. "
-        "    b. For key documents: list Title, Publication Date, Agency, a brief explanation of relevance from its abstract, and the HTML URL. "
-        "    c. Use clear formatting (e.g., bullet points). "
-        "6. **Handling No Results/Errors:** If no documents are found, clearly inform the user what search parameters you used (e.g., 'I searched for documents with keywords X and type Y but found nothing.'). Suggest broadening the search (e.g., removing a type filter, changing keywords, or adjusting dates). "
-        "7. **Clarification (If Truly Necessary):** Only if the request is extremely vague after several turns, ask for specific clarification. "
-        "8. **Default Search with Keywords:** If only keywords are provided (e.g., 'artificial intelligence and security'), use those keywords for the tool call without necessarily needing a document_type or date. "
-    )
-    model = genai.GenerativeModel(
-        model_name=GEMINI_MODEL_NAME,
-        tools=[search_tool_declaration],
-        system_instruction=system_instruction
-    )
+    """
+    Runs one user turn against Gemini, executing any search tool calls it makes.
+    The turn (user query, tool calls and responses, final answer) is appended to `chat.history`
+    in place, so earlier turns form an unchanged prefix that the provider's prefix cache can
+    reuse. If the turn does not end in a text answer it is rolled back out of the history.
+    Unless `include_tool_events` is set, this turn's tool results are compacted (see
+    redact_tool_events) once the answer is produced, keeping later prompts small.
+    With `history_top_k`, only the exchanges picked by select_relevant_history are sent for
+    this turn; the full history is restored afterwards with the new turn appended.
+    Must be awaited on a long-lived event loop: the SDK's async client is a process-wide
+    singleton whose connections are bound to the loop that first used it.
+    """
+    if history_top_k is None:
+        return await _run_tool_loop(user_query, chat, max_iterations, include_tool_events)
 
-    # Initialize or use provided conversation history
-    # The history should contain both 'user' and 'model' (and 'function') turns
-    if conversation_history is None:
-        current_messages_for_gemini = []
-    else:
-        current_messages_for_gemini = list(conversation_history) # Make a copy
+    full_history = chat.history
+    chat.history = await asyncio.to_thread(select_relevant_history, full_history, user_query, history_top_k)
+    sent_history_length = len(chat.history)
+    try:
+        return await _run_tool_loop(user_query, chat, max_iterations, include_tool_events)
+    finally:
+        chat.history = full_history + chat.history[sent_history_length:]
 
-    # Add the current user query to the history
-    current_messages_for_gemini.append(
-        genai.protos.Content(role="user", parts=[genai.protos.Part(text=user_query)])
-    )
 
-    logging.info(f"User query to Gemini (sync): {user_query}")
-    logging.info(f"Starting conversation with history length: {len(current_messages_for_gemini)}")
+def _parse_function_args(fc: genai.protos.FunctionCall) -> Dict[str, Any]:
+    """
+    Converts a FunctionCall's Struct args to plain Python values in a single protobuf pass,
+    then sanitizes them: blank strings become None and `limit` (a float in a Struct) an int.
+    """
+    function_args = json_format.MessageToDict(type(fc).pb(fc).args)
+    for name, value in function_args.items():
+        if isinstance(value, str) and not value.strip():
+            function_args[name] = None
+    if function_args.get("limit") is not None:
+        try:
+            function_args["limit"] = int(function_args["limit"])
+        except (TypeError, ValueError):
+            del function_args["limit"] # Fall back to the tool's default
+    return function_args
+
+async def _execute_tool_calls(function_calls: list, user_query: str) -> List[Dict[str, Any]]:
+    """
+    Runs the tool calls from one model turn and returns one response payload per call, in order.
+    Multiple search_federal_documents calls are answered with a single batched DB round-trip.
+    """
+    calls = []
+    for fc in function_calls:
+        function_name = fc.name
+        function_args = _parse_function_args(fc)
+        logging.info(f"Tool call: {function_name} with args: {function_args}")
+
+        # Fallback date logic (keep it, but improved prompt should reduce need)
+        if function_name == "search_federal_documents":
+            if ("start_date" not in function_args or not function_args.get("start_date")) and user_query: # Check if value is empty too
+                # (Your existing date parsing logic based on user_query)
+                # ...
+                pass # For brevity, assume your date logic is here
+        calls.append((function_name, function_args))
+
+    responses: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+    search_indexes = [i for i, (name, _) in enumerate(calls) if name == "search_federal_documents"]
+    if len(search_indexes) > 1:
+        try:
+            # Tools are blocking DB calls; run them off the event loop
+            batch_results = await asyncio.to_thread(search_federal_documents_batch, [calls[i][1] for i in search_indexes])
+            logging.info(f"Batched {len(search_indexes)} search_federal_documents calls into one query.")
+            for i, tool_response_data in zip(search_indexes, batch_results):
+                responses[i] = _tool_result_payload(tool_response_data)
+        except Exception as te:
+            logging.error(f"Error executing batched search: {te}", exc_info=True)
+            for i in search_indexes:
+                responses[i] = {"error": f"Error executing tool 'search_federal_documents': {str(te)}"}
 
+    for i, (function_name, function_args) in enumerate(calls):
+        if responses[i] is not None:
+            continue
+        if function_name not in available_tools:
+            responses[i] = {"error": f"Tool '{function_name}' not found."}
+            continue
+        try:
+            tool_function = available_tools[function_name]
+            # Tools are blocking DB calls; run them off the event loop
+            tool_response_data = await asyncio.to_thread(tool_function, **function_args)
+            logging.info(f"Tool '{function_name}' response: {str(tool_response_data)[:500]}...")
+            responses[i] = _tool_result_payload(tool_response_data)
+        except Exception as te:
+            logging.error(f"Error executing tool {function_name}: {te}", exc_info=True)
+            responses[i] = {"error": f"Error executing tool '{function_name}': {str(te)}"}
+    return responses
 
+async def _run_tool_loop(
+    user_query: str,
+    chat: genai.ChatSession,
+    max_iterations: int,
+    include_tool_events: bool
+) -> str:
+    # Pick up the current date's system instruction if the session spans midnight
+    chat.model = get_model(datetime.now().strftime("%Y-%m-%d"))
+    turn_start = len(chat.history)
+
+    def rollback_turn():
+        # Never leave a dangling user message or an unanswered tool call in the session
+        chat.history = chat.history[:turn_start]
+
+    logging.info(f"User query to Gemini: {user_query}")
+    logging.info(f"Starting conversation with history length: {turn_start}")
+
+    next_message: Any = user_query
     for iteration in range(max_iterations):
-        logging.info(f"Gemini Iteration (sync) {iteration + 1}.")
-        # Log the full history being sent to Gemini for this turn
-        # for i, msg_content in enumerate(current_messages_for_gemini):
-        #    logging.debug(f"History msg {i} to Gemini: Role='{msg_content.role}', Parts='{[p.text if hasattr(p, 'text') else str(p) for p in msg_content.parts]}'")
+        logging.info(f"Gemini Iteration {iteration + 1}.")
 
         try:
-            response = model.generate_content(
-                current_messages_for_gemini, # Send the full conversation history
-            )
+            # The session appends both the message sent and the model's reply to its history
+            response = await chat.send_message_async(next_message)
             if not response.candidates:
                 logging.warning("Gemini response had no candidates.")
+                rollback_turn()
                 return "I'm sorry, I didn't receive a valid response from the model."
             candidate_content = response.candidates[0].content
-            # Add model's response (tool call or text) to history for the *next* iteration or final output
-            current_messages_for_gemini.append(candidate_content)
 
         except Exception as e:
-            logging.error(f"Error calling Gemini API (sync): {e}", exc_info=True)
-            # Remove the last user message if API call failed, so it's not duplicated on retry by user
-            if current_messages_for_gemini and current_messages_for_gemini[-1].role == "user":
-                 current_messages_for_gemini.pop()
+            logging.error(f"Error calling Gemini API: {e}", exc_info=True)
+            # Remove this turn so the user's retry isn't duplicated in the history
+            rollback_turn()
             return f"Sorry, an error occurred while communicating with the AI model: {str(e)}"
 
         if candidate_content.parts:
-            function_call_part = next((part for part in candidate_content.parts if hasattr(part, 'function_call') and part.function_call.name), None)
+            # Gemini may emit several (parallel) function calls in one turn; answer them together
+            function_calls = [part.function_call for part in candidate_content.parts if hasattr(part, 'function_call') and part.function_call.name]
 
-            if function_call_part:
-                fc = function_call_part.function_call
-                function_name = fc.name
-                function_args = dict(fc.args)
-                logging.info(f"Tool call (sync): {function_name} with args: {function_args}")
+            if function_calls:
+                tool_responses = await _execute_tool_calls(function_calls, user_query)
 
-                # Fallback date logic (keep it, but improved prompt should reduce need)
-                if function_name == "search_federal_documents":
-                    if ("start_date" not in function_args or not function_args.get("start_date")) and user_query: # Check if value is empty too
-                        # (Your existing date parsing logic based on user_query)
-                        # ...
-                        pass # For brevity, assume your date logic is here
-
-
-                if function_name not in available_tools:
-                    tool_response_content_for_llm = {"error": f"Tool '{function_name}' not found."}
-                else:
-                    try:
-                        tool_function = available_tools[function_name]
-                        tool_response_data = tool_function(**function_args)
-                        logging.info(f"Tool '{function_name}' response (sync): {str(tool_response_data)[:500]}...")
-                        tool_response_content_for_llm = {"result": tool_response_data}
-                    except Exception as te:
-                        logging.error(f"Error executing tool {function_name} (sync): {te}", exc_info=True)
-                        tool_response_content_for_llm = {"error": f"Error executing tool '{function_name}': {str(te)}"}
-
-                # Append the function response to the history
-                current_messages_for_gemini.append(
-                    genai.protos.Content(
-                        role="function",
-                        parts=[genai.protos.Part(
+                # Send all function responses back in one message, in call order
+                next_message = genai.protos.Content(
+                    role="function",
+                    parts=[
+                        genai.protos.Part(
                             function_response=genai.protos.FunctionResponse(
-                                name=function_name,
+                                name=fc.name,
                                 response=tool_response_content_for_llm
                             )
-                        )]
-                    )
+                        )
+                        for fc, tool_response_content_for_llm in zip(function_calls, tool_responses)
+                    ]
                 )
                 continue # Next iteration for LLM to process tool result
 
             else: # No function call, should be a text response
                 final_text_response = "".join(part.text for part in candidate_content.parts if hasattr(part, 'text'))
                 if final_text_response:
-                    logging.info(f"Gemini final text response (sync): {final_text_response}")
+                    logging.info(f"Gemini final text response: {final_text_response}")
+                    if not include_tool_events:
+                        history = chat.history
+                        chat.history = history[:turn_start] + redact_tool_events(history[turn_start:])
                     return final_text_response
                 else:
                     logging.warning("Gemini returned parts but no text and no tool call. Previous turn likely resulted in an error or confusion.")
+                    rollback_turn()
                     return "I seem to have gotten a bit confused. Could you please try rephrasing your request or start over?"
         else:
-            logging.warning("Gemini response had no parts (sync).")
+            logging.warning("Gemini response had no parts.")
+            rollback_turn()
             return "I'm sorry, I received an empty response from the AI model."
 
-    logging.warning("Max iterations reached without a final text answer from Gemini (sync).")
+    logging.warning("Max iterations reached without a final text answer from Gemini.")
+    rollback_turn()
     return "I'm having trouble finalizing an answer. Please try rephrasing your request."
 
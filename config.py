@@ -10,6 +10,13 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Size of the synchronous MySQL connection pool used by db_tools.py
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+
+# In-process cache for search_federal_documents tool calls
+SEARCH_CACHE_MAXSIZE = int(os.getenv("SEARCH_CACHE_MAXSIZE", 512))
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 1800)) # 30 minutes
+
 
 # Directory for raw data
 RAW_DATA_DIR = "raw_data"
\ No newline at end of file
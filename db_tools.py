@@ -1,107 +1,481 @@
 # db_tools_sync.py (New or modified file)
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error # Import Error for exception handling
+from mysql.connector.errors import PoolError
+import inspect
+import json
 import logging
-from typing import List, Dict, Optional, Any
-from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import List, Dict, Optional, Any, Callable
+from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, DB_POOL_SIZE, SEARCH_CACHE_MAXSIZE, SEARCH_CACHE_TTL_SECONDS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# No global pool needed in the same way for simple synchronous connections.
-# Connections are typically opened and closed per function or per request.
+CACHE_MISS = object() # Returned by cache_get() when there is no live entry
+
+def ttl_lru_cache(maxsize: int, ttl: float, cacheable: Callable[[Any], bool] = lambda result: True):
+    """
+    Thread-safe LRU cache with a time-to-live per entry.
+    String arguments are normalized (stripped, lowercased) before building the key, and the
+    function is called with the normalized values too, so 'AI ' and 'ai' share an entry
+    because they run the same query. Only results for which `cacheable(result)` is true are
+    stored. The wrapped function gets `cache_clear()`, `cache_normalize(*args, **kwargs)`
+    (returns the normalized arguments by name), plus `cache_get(*args, **kwargs)` (returns
+    CACHE_MISS if absent) and `cache_set(result, *args, **kwargs)` for callers that compute
+    results for the same normalized arguments another way (e.g. in a batch).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        lock = threading.Lock()
+
+        def cache_normalize(*args, **kwargs) -> Dict[str, Any]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return {
+                name: value.strip().lower() if isinstance(value, str) else value
+                for name, value in bound.arguments.items()
+            }
+
+        def make_key(args, kwargs) -> str:
+            return json.dumps(cache_normalize(*args, **kwargs), sort_keys=True, default=str)
+
+        def cache_get(*args, **kwargs):
+            key = make_key(args, kwargs)
+            with lock:
+                entry = entries.get(key)
+                if entry is not None:
+                    expires_at, result = entry
+                    if expires_at > time.monotonic():
+                        entries.move_to_end(key)
+                        logging.debug(f"Cache hit for {func.__name__}: {key}")
+                        return result
+                    del entries[key]
+            return CACHE_MISS
+
+        def cache_set(result, *args, **kwargs):
+            if not cacheable(result):
+                return
+            key = make_key(args, kwargs)
+            with lock:
+                entries[key] = (time.monotonic() + ttl, result)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = cache_normalize(*args, **kwargs)
+            result = cache_get(**arguments)
+            if result is CACHE_MISS:
+                result = func(**arguments)
+                cache_set(result, **arguments)
+            return result
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        wrapper.cache_normalize = cache_normalize
+        wrapper.cache_get = cache_get
+        wrapper.cache_set = cache_set
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+@dataclass
+class SearchResult:
+    """
+    Outcome of a search. `ok` with the matching `rows` (empty, with a `message`, when nothing
+    matched), or not `ok` with the error in `message`.
+    """
+    ok: bool
+    rows: List[Dict[str, Any]]
+    message: str = ""
+
+def _is_cacheable_search_result(result: SearchResult) -> bool:
+    """Errors are not cached so a transient DB failure is retried on the next call."""
+    return result.ok
+
+# A single pool is shared by every tool call so the TCP/auth handshake is paid once per
+# pooled connection instead of once per call. It is created lazily on first use so that
+# importing this module (e.g. from the Streamlit app) does not require a reachable database.
+POOL: Optional[mysql.connector.pooling.MySQLConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# MySQLConnectionPool raises PoolError at once when every connection is checked out, so
+# callers beyond DB_POOL_SIZE wait (with backoff) for one to be returned, up to this long
+POOL_CHECKOUT_TIMEOUT_SECONDS = 10.0
+POOL_CHECKOUT_RETRY_SECONDS = 0.02
+POOL_CHECKOUT_MAX_RETRY_SECONDS = 0.5
+
+def get_db_pool() -> mysql.connector.pooling.MySQLConnectionPool:
+    """Returns the module-level connection pool, creating it on first use."""
+    global POOL
+    with _pool_lock:
+        if POOL is None:
+            POOL = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="fedreg",
+                pool_size=DB_POOL_SIZE,
+                # Resetting the session on check-in would deallocate the server-side prepared
+                # statements that search_federal_documents keeps per connection
+                pool_reset_session=False,
+                # Without the reset, nothing ends a transaction on check-in; autocommit keeps
+                # these read-only sessions from pinning an old snapshot (and a metadata lock
+                # on the table) across calls
+                autocommit=True,
+                # Pinned explicitly: the C extension is already Connector/Python's default
+                # (since 8.0.11), but the driver silently uses pure Python when it is missing
+                use_pure=False,
+                host=DB_HOST,
+                port=DB_PORT,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                database=DB_NAME
+            )
+            logging.info(f"MySQL connection pool created (size={DB_POOL_SIZE})")
+            if not mysql.connector.HAVE_CEXT:
+                logging.warning("mysql-connector-python C extension not available; rows are decoded in pure Python.")
+        return POOL
 
 def get_db_connection():
-    """Establishes a synchronous database connection."""
-    try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        if connection.is_connected():
-            logging.debug("MySQL connection successful")
-            return connection
-    except Error as e:
-        logging.error(f"Error connecting to MySQL: {e}")
-        return None
+    """
+    Checks out a synchronous database connection from the pool, waiting up to
+    POOL_CHECKOUT_TIMEOUT_SECONDS if all of them are in use.
+    Calling `.close()` on it returns it to the pool rather than closing the socket.
+    """
+    deadline = time.monotonic() + POOL_CHECKOUT_TIMEOUT_SECONDS
+    delay = POOL_CHECKOUT_RETRY_SECONDS
+    while True:
+        try:
+            connection = get_db_pool().get_connection()
+            if connection.is_connected():
+                logging.debug("MySQL connection successful")
+                return connection
+            # Hand the slot back so the pool doesn't shrink by one for the life of the process
+            connection.close()
+            logging.error("Pooled MySQL connection is not connected.")
+            return None
+        except PoolError as e:
+            if time.monotonic() + delay > deadline:
+                logging.error(f"Timed out waiting for a pooled MySQL connection: {e}")
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, POOL_CHECKOUT_MAX_RETRY_SECONDS)
+        except Error as e:
+            logging.error(f"Error connecting to MySQL: {e}")
+            return None
 
-def search_federal_documents(
-    keywords: Optional[str] = None,
-    document_type: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    agency_name: Optional[str] = None,
-    limit: int = 5
-) -> List[Dict[str, Any]]:
+# MATCH ... AGAINST ignores words shorter than the server's minimum token length
+# (ft_min_word_len for MyISAM, innodb_ft_min_token_size for InnoDB), so keyword
+# searches made only of short tokens like "AI" fall back to LIKE.
+FULLTEXT_MIN_WORD_LEN = 4
+ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+# Flipped off the first time the server reports the table has no FULLTEXT index on
+# (title, abstract, excerpts), so later searches go straight to the LIKE path.
+_fulltext_available = True
+
+WORD_RE = re.compile(r"\w+") # Same split as the server's FULLTEXT parser (no boolean operators survive)
+
+# InnoDB's default FULLTEXT stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD).
+# Stopwords are not indexed, so requiring one would match nothing.
+FULLTEXT_STOPWORDS = frozenset((
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how",
+    "i", "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "who", "will", "with", "und", "www",
+))
+
+def _fulltext_boolean_query(keywords: str) -> Optional[str]:
     """
-    Searches federal documents (synchronously).
-    Returns a list of matching documents or an empty list.
+    Turns `keywords` into a BOOLEAN MODE query requiring every indexed word, or None if there
+    is none (too short, or stopwords). The last word is a prefix term since the phrase may end
+    mid-word (e.g. "executive order" also matches "executive orders").
+    FULLTEXT matches whole words, so this path finds the phrase only where it starts at a word
+    boundary: "regulation" matches "regulations" but not "deregulation".
     """
-    connection = get_db_connection()
-    if not connection:
-        return [{"error": "Database connection failed."}]
+    words = WORD_RE.findall(keywords.lower())
+    if not words:
+        return None
+    last_word = words[-1]
+    terms = [f"+{word}" for word in words[:-1] if len(word) >= FULLTEXT_MIN_WORD_LEN and word not in FULLTEXT_STOPWORDS]
+    # A prefix of a stopword (e.g. "wher") may be completing one, which is not indexed either
+    if len(last_word) >= FULLTEXT_MIN_WORD_LEN and not any(stopword.startswith(last_word) for stopword in FULLTEXT_STOPWORDS):
+        terms.append(f"+{last_word}*")
+    if not terms:
+        return None
+    return " ".join(terms)
+
+def _use_fulltext(keywords: str) -> bool:
+    return _fulltext_available and _fulltext_boolean_query(keywords) is not None
+
+SEARCH_COLUMNS = "document_number, title, type, abstract, publication_date, html_url, agency_name"
+NO_RESULTS_MESSAGE = "No documents found matching your criteria."
+
+# Bits of the search variant key: which filters are set, and how keywords are matched
+VARIANT_KEYWORDS = 1 << 0
+VARIANT_DOCUMENT_TYPE = 1 << 1
+VARIANT_START_DATE = 1 << 2
+VARIANT_END_DATE = 1 << 3
+VARIANT_AGENCY_NAME = 1 << 4
+VARIANT_FULLTEXT = 1 << 5
+
+# Rendered SQL per variant key. Reusing the exact same string per shape is what lets a
+# prepared cursor skip re-preparing it on the server.
+SQL_CACHE: Dict[int, str] = {}
 
-    # Using dictionary=True with the cursor makes it return rows as dictionaries
-    cursor = connection.cursor(dictionary=True)
-    results = []
+def _render_search_sql(variant_key: int) -> str:
+    query_parts = [f"SELECT {SEARCH_COLUMNS} FROM federal_documents WHERE 1=1"]
+    if variant_key & VARIANT_FULLTEXT:
+        # The ft_kw FULLTEXT index narrows the scan to documents containing every indexed
+        # word; the LIKE then keeps the exact-phrase match on just those rows
+        query_parts.append("AND MATCH(title, abstract, excerpts) AGAINST (%s IN BOOLEAN MODE)")
+    if variant_key & VARIANT_KEYWORDS:
+        query_parts.append("AND (title LIKE %s OR abstract LIKE %s OR excerpts LIKE %s)")
+    if variant_key & VARIANT_DOCUMENT_TYPE:
+        query_parts.append("AND type = %s")
+    if variant_key & VARIANT_START_DATE:
+        query_parts.append("AND publication_date >= %s")
+    if variant_key & VARIANT_END_DATE:
+        query_parts.append("AND publication_date <= %s")
+    if variant_key & VARIANT_AGENCY_NAME:
+        query_parts.append("AND agency_name LIKE %s")
+    query_parts.append("ORDER BY publication_date DESC")
+    query_parts.append("LIMIT %s") # Use %s for limit as well with mysql.connector
+    return " ".join(query_parts)
 
-    query_parts = ["SELECT document_number, title, type, abstract, publication_date, html_url, agency_name FROM federal_documents WHERE 1=1"]
+def _build_search_query(
+    keywords: Optional[str],
+    document_type: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    agency_name: Optional[str],
+    limit: int,
+    call_id: Optional[int] = None
+) -> tuple[str, List[Any]]:
+    """
+    Returns the parameterized SELECT for search_federal_documents and its parameters.
+    With `call_id`, each row is tagged with it so several queries can share one UNION ALL.
+    """
+    variant_key = 0
     params = []
 
     if keywords:
-        query_parts.append("AND (title LIKE %s OR abstract LIKE %s OR excerpts LIKE %s)")
+        variant_key |= VARIANT_KEYWORDS
+        if _use_fulltext(keywords):
+            variant_key |= VARIANT_FULLTEXT
+            params.append(_fulltext_boolean_query(keywords))
         keyword_param = f"%{keywords}%"
         params.extend([keyword_param, keyword_param, keyword_param])
     if document_type:
-        query_parts.append("AND type = %s")
+        variant_key |= VARIANT_DOCUMENT_TYPE
         params.append(document_type)
-    # ... (add other conditions similarly for start_date, end_date, agency_name) ...
     if start_date:
-        query_parts.append("AND publication_date >= %s")
+        variant_key |= VARIANT_START_DATE
         params.append(start_date)
     if end_date:
-        query_parts.append("AND publication_date <= %s")
+        variant_key |= VARIANT_END_DATE
         params.append(end_date)
     if agency_name:
-        query_parts.append("AND agency_name LIKE %s")
+        variant_key |= VARIANT_AGENCY_NAME
         params.append(f"%{agency_name}%")
+    params.append(limit)
 
+    sql = SQL_CACHE.get(variant_key)
+    if sql is None:
+        sql = SQL_CACHE.setdefault(variant_key, _render_search_sql(variant_key))
+    if call_id is not None:
+        sql = sql.replace("SELECT ", f"SELECT {int(call_id)} AS call_id, ", 1)
+    return sql, params
 
-    query_parts.append("ORDER BY publication_date DESC")
-    query_parts.append(f"LIMIT %s") # Use %s for limit as well with mysql.connector
-    params.append(limit)
+def _execute_search(execute: Callable[[str, tuple], Any], build_query: Callable[[], tuple[str, List[Any]]]) -> Any:
+    """
+    Runs `execute(sql, params)` on the query from `build_query()` and returns its result. If the
+    server has no matching FULLTEXT index, disables the FULLTEXT path for this process and
+    retries once with the rebuilt (LIKE) query.
+    """
+    global _fulltext_available
 
-    final_query = " ".join(query_parts)
+    final_query, params = build_query()
     logging.info(f"Executing SYNC DB query: {final_query} with params: {params}")
+    try:
+        return execute(final_query, tuple(params))
+    except Error as e:
+        if e.errno != ER_FT_MATCHING_KEY_NOT_FOUND:
+            raise
+        logging.warning("No FULLTEXT index on federal_documents (title, abstract, excerpts); falling back to LIKE search.")
+        _fulltext_available = False
+        final_query, params = build_query()
+        return execute(final_query, tuple(params))
+
+# Prepared-statement cursors kept open per underlying pooled connection and per SQL string,
+# so each query shape is prepared once per connection and then only executed. Entries go away
+# with their connection object; the server session id they were prepared under is kept too, so
+# a reconnect (whose new session has none of them) starts afresh. A pooled connection is used
+# by one thread at a time.
+_PREPARED_CURSORS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+def _execute_prepared(connection, sql: str, params: tuple):
+    """Executes `sql` on the connection's cached prepared cursor for it and returns the cursor."""
+    cnx = getattr(connection, "_cnx", connection) # The pooled wrapper is recreated per checkout
+    session_id, cursors = _PREPARED_CURSORS.get(cnx, (None, None))
+    if cursors is None or session_id != cnx.connection_id:
+        _discard_prepared_cursors(connection)
+        cursors = {}
+        _PREPARED_CURSORS[cnx] = (cnx.connection_id, cursors)
+    cursor = cursors.get(sql)
+    if cursor is None:
+        cursor = connection.cursor(prepared=True, dictionary=True)
+        cursors[sql] = cursor
+    cursor.execute(sql, params)
+    return cursor
+
+def _discard_prepared_cursors(connection):
+    _, cursors = _PREPARED_CURSORS.pop(getattr(connection, "_cnx", connection), (None, {}))
+    for cursor in cursors.values():
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+def _format_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Convert date objects to strings for consistency if needed
+    for row in rows:
+        if 'publication_date' in row and hasattr(row['publication_date'], 'isoformat'):
+            row['publication_date'] = row['publication_date'].isoformat()
+    return rows
+
+@ttl_lru_cache(maxsize=SEARCH_CACHE_MAXSIZE, ttl=SEARCH_CACHE_TTL_SECONDS, cacheable=_is_cacheable_search_result)
+def search_federal_documents(
+    keywords: Optional[str] = None,
+    document_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    agency_name: Optional[str] = None,
+    limit: int = 5
+) -> SearchResult:
+    """
+    Searches federal documents (synchronously).
+    Returns a SearchResult with the matching documents, or the error if the search failed.
+    String arguments are stripped and lowercased before the query runs (the search columns use
+    case-insensitive collations, so only the stripping changes what matches).
+    Successful results are cached in-process for SEARCH_CACHE_TTL_SECONDS; call
+    `search_federal_documents.cache_clear()` to drop them after new data is loaded.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return SearchResult(ok=False, rows=[], message="Database connection failed.")
 
     try:
-        cursor.execute(final_query, tuple(params))
-        db_results = cursor.fetchall() # Fetches all rows
+        # Rows come back as dictionaries from a prepared cursor reused across calls of the same shape
+        cursor = _execute_search(
+            lambda sql, params: _execute_prepared(connection, sql, params),
+            lambda: _build_search_query(keywords, document_type, start_date, end_date, agency_name, limit)
+        )
+        db_results = cursor.fetchmany(size=limit) # At most `limit` rows are decoded
+        cursor.fetchall() # Drain anything left so the statement can be re-executed
         if not db_results:
             logging.info("No documents found matching criteria (sync).")
-            return [{"message": "No documents found matching your criteria."}]
-
-        # Convert date objects to strings for consistency if needed
-        for row in db_results:
-            if 'publication_date' in row and hasattr(row['publication_date'], 'isoformat'):
-                row['publication_date'] = row['publication_date'].isoformat()
-        results = db_results
+            return SearchResult(ok=True, rows=[], message=NO_RESULTS_MESSAGE)
+        result = SearchResult(ok=True, rows=_format_rows(db_results))
 
     except Error as e:
         logging.error(f"Error querying database (sync): {e}")
-        results = [{"error": f"An error occurred while searching the database (sync): {str(e)}"}]
+        # The connection's cursors may be mid-result or gone with the session; prepare afresh next time
+        _discard_prepared_cursors(connection)
+        result = SearchResult(ok=False, rows=[], message=f"An error occurred while searching the database (sync): {str(e)}")
     finally:
-        if connection.is_connected():
-            cursor.close()
+        # Always hand the connection back, even if it dropped, so the pool doesn't leak slots
+        connection.close()
+        logging.debug("MySQL connection returned to pool")
+    return result
+
+def _run_batched_search(pending: Dict[int, Dict[str, Any]]) -> Dict[int, SearchResult]:
+    """Runs every pending call as one UNION ALL statement and splits the rows back by call_id."""
+    connection = get_db_connection()
+    if not connection:
+        failed = SearchResult(ok=False, rows=[], message="Database connection failed.")
+        return {call_id: failed for call_id in pending}
+
+    cursor = connection.cursor(dictionary=True, buffered=False)
+
+    def build_query() -> tuple[str, List[Any]]:
+        subqueries, params = [], []
+        for call_id, arguments in pending.items():
+            subquery, subquery_params = _build_search_query(call_id=call_id, **arguments)
+            subqueries.append(f"({subquery})")
+            params.extend(subquery_params)
+        # A UNION has no row order of its own; the outer ORDER BY gives each call's rows back
+        # in the same order its own query would
+        return " UNION ALL ".join(subqueries) + " ORDER BY call_id, publication_date DESC", params
+
+    def execute(sql: str, params: tuple):
+        cursor.execute(sql, params)
+        return cursor
+
+    try:
+        # The combined statement's shape varies per batch, so it stays on the text protocol
+        _execute_search(execute, build_query)
+        rows_by_call: Dict[int, List[Dict[str, Any]]] = {call_id: [] for call_id in pending}
+        for row in cursor.fetchall(): # Bounded by the sum of the per-call LIMITs
+            rows_by_call[row.pop("call_id")].append(row)
+        results = {
+            call_id: SearchResult(ok=True, rows=_format_rows(rows)) if rows else SearchResult(ok=True, rows=[], message=NO_RESULTS_MESSAGE)
+            for call_id, rows in rows_by_call.items()
+        }
+    except Error as e:
+        logging.error(f"Error querying database (sync, batch): {e}")
+        failed = SearchResult(ok=False, rows=[], message=f"An error occurred while searching the database (sync): {str(e)}")
+        results = {call_id: failed for call_id in pending}
+    finally:
+        try:
+            if connection.is_connected():
+                cursor.close()
+        finally:
+            # Even if closing the cursor fails (e.g. an unread result), the slot goes back
             connection.close()
-            logging.debug("MySQL connection closed")
+    return results
+
+def search_federal_documents_batch(calls: List[Dict[str, Any]]) -> List[SearchResult]:
+    """
+    Runs several search_federal_documents calls, given as keyword-argument dicts, in a single
+    database round-trip. Calls already in the search cache are answered from it; the rest are
+    combined into one UNION ALL statement. Returns one SearchResult per call, in order, exactly
+    as search_federal_documents would return it.
+    """
+    results: List[Optional[SearchResult]] = [None] * len(calls)
+    pending: Dict[int, Dict[str, Any]] = {}
+    for call_id, call in enumerate(calls):
+        try:
+            # The same values search_federal_documents would run its query with
+            arguments = search_federal_documents.cache_normalize(**call)
+        except TypeError as e:
+            results[call_id] = SearchResult(ok=False, rows=[], message=f"Invalid search arguments: {e}")
+            continue
+        cached = search_federal_documents.cache_get(**arguments)
+        if cached is CACHE_MISS:
+            pending[call_id] = arguments
+        else:
+            results[call_id] = cached
+
+    if pending:
+        for call_id, result in _run_batched_search(pending).items():
+            search_federal_documents.cache_set(result, **pending[call_id])
+            results[call_id] = result
     return results
 
 # Example usage for testing db_tools_sync.py directly
 if __name__ == "__main__":
     print("Testing DB search...")
-    docs = search_federal_documents(keywords="executive order AI", limit=2)
-    for doc in docs:
+    result = search_federal_documents(keywords="executive order AI", limit=2)
+    if not result.ok or not result.rows:
+        print(result.message)
+    for doc in result.rows:
         print(doc)
\ No newline at end of file
@@ -1,11 +1,14 @@
 # downloader.py
+import argparse
 import asyncio
 import aiohttp
 import aiofiles
 import os
 from datetime import datetime, timedelta # Essential for dynamic date ranges
-import json
 import logging
+import orjson
+from typing import Optional
+from json_state import load_json_state, save_json_state
 
 
 RAW_DATA_DIR = "raw_data" # Fallback if config.py is not found or RAW_DATA_DIR isn't in it
@@ -14,114 +17,211 @@ logger = logging.getLogger(__name__) # Use __name__ for module-specific logger
 
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 
+# Per-date download state, so dates already on disk are not fetched again.
+# Maps "YYYY-MM-DD" to "complete" (every page saved) or "empty" (no documents published).
+# It says nothing about the database: processor.py records which files it has loaded.
+STATE_FILE = os.path.join(RAW_DATA_DIR, "state.json")
+STATE_COMPLETE = "complete"
+STATE_EMPTY = "empty"
+
 BASE_API_URL = "https://www.federalregister.gov/api/v1/documents.json"
+USER_AGENT = "MyDataPipeline/1.0 (DailyUpdater)"
+REQUEST_TIMEOUT_SECONDS = 120
 
-async def fetch_documents_for_date(session: aiohttp.ClientSession, target_date_str: str, per_page: int = 1000):
-    """
-    Fetches all documents for a specific publication date.
-    Handles pagination within this function for a single date.
-    """
-    all_results_for_date = []
-    current_page = 1
-    total_pages = 1 # Assume at least one page
+# Bound on concurrent requests against the API, shared by every date and page.
+# Used for both the connector's socket limit and the request semaphore.
+MAX_CONCURRENT_REQUESTS = 8
+DNS_CACHE_TTL_SECONDS = 300
 
-    logger.info(f"Fetching documents for date: {target_date_str}")
+# Retries with exponential backoff for throttling, transient server errors and timeouts
+MAX_RETRIES = 4
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
 
-    while current_page <= total_pages:
-        params = {
-            "conditions[publication_date][is]": target_date_str,
-            "per_page": per_page,
-            "page": current_page
-            # You can add other default filters here if desired, e.g., specific document types
-            # "conditions[type][]": "Presidential Document", # Example: if you ONLY want these
-        }
+async def get_json_with_retries(session: aiohttp.ClientSession, params: dict) -> dict:
+    """
+    GETs BASE_API_URL and returns the decoded JSON body.
+    Retries on 429/5xx (honouring a numeric Retry-After) and timeouts; the last failure is raised.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        delay = RETRY_BASE_DELAY_SECONDS * 2 ** attempt
         try:
-            headers = {"User-Agent": "MyDataPipeline/1.0 (DailyUpdater)"}
-            async with session.get(BASE_API_URL, params=params, headers=headers, timeout=120) as response: # Increased timeout
+            async with session.get(BASE_API_URL, params=params) as response:
+                if response.status in RETRYABLE_STATUSES and attempt < MAX_RETRIES:
+                    retry_after = response.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                    logger.warning(f"HTTP {response.status} for {params}; retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES}).")
+                    await asyncio.sleep(delay)
+                    continue
                 response.raise_for_status()
-                data = await response.json()
-
-                if not data:
-                    logger.warning(f"Received empty API response for {target_date_str}, page {current_page}.")
-                    break
-
-                results_on_page = data.get("results", [])
-                all_results_for_date.extend(results_on_page)
-                logger.debug(f"Date {target_date_str}: Fetched {len(results_on_page)} docs on page {current_page}. Total for date: {len(all_results_for_date)}.")
-
-                if current_page == 1: # Only update total_pages on the first successful page fetch
-                    total_pages = data.get("total_pages", 1)
-                    if total_pages == 0 and not results_on_page:
-                        logger.info(f"No documents found for date {target_date_str} (total_pages=0).")
-                        break # No need to fetch further pages
-                    if total_pages > 1:
-                        logger.info(f"Date {target_date_str}: Total pages to fetch: {total_pages}.")
-
-                if not results_on_page or current_page >= total_pages:
-                    break # No more results on this page or all pages fetched
-
-                current_page += 1
-                if total_pages > 1 : await asyncio.sleep(0.2) # Small polite delay if paginating for a date
-
+                # orjson parses the ~1 MB per_page=1000 bodies much faster than the stdlib decoder
+                return orjson.loads(await response.read())
         except asyncio.TimeoutError:
-            logger.error(f"Timeout error fetching data for {target_date_str}, page {current_page}.", exc_info=False) # exc_info=False for cleaner log on timeout
-            break # Stop fetching for this date on timeout
-        except aiohttp.ClientResponseError as e_http:
-            logger.error(f"HTTP error {e_http.status} fetching data for {target_date_str}, page {current_page}: {e_http.message}", exc_info=False)
-            break # Stop fetching for this date on HTTP error
-        except Exception as e:
-            logger.error(f"Generic error fetching data for {target_date_str}, page {current_page}.", exc_info=True)
-            break # Stop fetching for this date on other errors
+            if attempt == MAX_RETRIES:
+                raise
+            logger.warning(f"Timeout for {params}; retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES}).")
+            await asyncio.sleep(delay)
+
+def is_already_fetched(state: dict, date_str: str) -> bool:
+    status = state.get(date_str)
+    if status == STATE_EMPTY:
+        return True
+    if status == STATE_COMPLETE:
+        filepath = os.path.join(RAW_DATA_DIR, f"{date_str}.json")
+        return os.path.isfile(filepath) and os.path.getsize(filepath) > 0
+    return False
+
+def log_fetch_error(target_date_str: str, page: int, error: BaseException):
+    """Logs a failed page fetch; the rest of the date's pages are still used."""
+    if isinstance(error, asyncio.TimeoutError):
+        logger.error(f"Timeout error fetching data for {target_date_str}, page {page}.", exc_info=False) # exc_info=False for cleaner log on timeout
+    elif isinstance(error, aiohttp.ClientResponseError):
+        logger.error(f"HTTP error {error.status} fetching data for {target_date_str}, page {page}: {error.message}", exc_info=False)
+    else:
+        logger.error(f"Generic error fetching data for {target_date_str}, page {page}.", exc_info=error)
+
+async def fetch_page(session: aiohttp.ClientSession, request_semaphore: asyncio.Semaphore, target_date_str: str, page: int, per_page: int) -> dict:
+    """Fetches one page of documents for a date, holding a slot of the shared request semaphore."""
+    params = {
+        "conditions[publication_date][is]": target_date_str,
+        "per_page": per_page,
+        "page": page
+        # You can add other default filters here if desired, e.g., specific document types
+        # "conditions[type][]": "Presidential Document", # Example: if you ONLY want these
+    }
+    async with request_semaphore:
+        return await get_json_with_retries(session, params)
+
+async def fetch_documents_for_date(session: aiohttp.ClientSession, request_semaphore: asyncio.Semaphore, target_date_str: str, per_page: int = 1000):
+    """
+    Fetches all documents for a specific publication date.
+    Page 1 reports total_pages; pages 2..N are then fetched concurrently, bounded by
+    `request_semaphore`, which is shared across all dates.
+    The returned dict's "complete" flag is False if any page could not be fetched.
+    """
+    logger.info(f"Fetching documents for date: {target_date_str}")
+
+    try:
+        first_page = await fetch_page(session, request_semaphore, target_date_str, 1, per_page)
+    except Exception as e:
+        log_fetch_error(target_date_str, 1, e)
+        first_page = None
+
+    if not first_page:
+        logger.warning(f"Received no usable API response for {target_date_str}, page 1.")
+        return {"date": target_date_str, "count": 0, "results": [], "complete": False}
+
+    complete = True
+    all_results_for_date = list(first_page.get("results", []))
+    total_pages = first_page.get("total_pages", 1)
+    if total_pages == 0 and not all_results_for_date:
+        logger.info(f"No documents found for date {target_date_str} (total_pages=0).")
+    elif total_pages > 1:
+        logger.info(f"Date {target_date_str}: Total pages to fetch: {total_pages}.")
+        pages = await asyncio.gather(
+            *(fetch_page(session, request_semaphore, target_date_str, page, per_page) for page in range(2, total_pages + 1)),
+            return_exceptions=True
+        )
+        for page_number, data in enumerate(pages, start=2):
+            if isinstance(data, BaseException):
+                log_fetch_error(target_date_str, page_number, data)
+                complete = False
+                continue
+            results_on_page = data.get("results", []) if data else []
+            all_results_for_date.extend(results_on_page)
+            logger.debug(f"Date {target_date_str}: Fetched {len(results_on_page)} docs on page {page_number}.")
 
     if all_results_for_date:
         logger.info(f"Finished fetching for date {target_date_str}. Total documents: {len(all_results_for_date)}.")
     # Return even if empty, so save_raw_data can decide to save an empty result file or not
-    return {"date": target_date_str, "count": len(all_results_for_date), "results": all_results_for_date}
+    return {"date": target_date_str, "count": len(all_results_for_date), "results": all_results_for_date, "complete": complete}
 
 
-async def save_raw_data(date_str: str, data_for_date: dict):
-    """Saves the fetched data for a specific date to a JSON file."""
+async def save_raw_data(date_str: str, data_for_date: dict) -> bool:
+    """Saves the fetched data for a specific date to a JSON file. Returns True if a file was written."""
     # data_for_date is the dict returned by fetch_documents_for_date
     if not data_for_date or data_for_date.get("count", 0) == 0: # Check count
         logger.info(f"No documents to save for date {date_str} (count is 0).")
-        return
+        return False
 
     filename = f"{date_str}.json" # File per date
     filepath = os.path.join(RAW_DATA_DIR, filename)
     try:
-        async with aiofiles.open(filepath, mode='w', encoding='utf-8') as f:
-            await f.write(json.dumps(data_for_date, indent=2)) # Save the whole dict
+        # Compact output (no indent) roughly halves the file size, and encoding ~1000 documents
+        # runs in a worker thread so it doesn't stall the other dates' downloads.
+        payload = await asyncio.to_thread(orjson.dumps, data_for_date)
+        # Written under a temporary name and renamed, so the processor never reads a partial file
+        tmp_path = f"{filepath}.tmp"
+        async with aiofiles.open(tmp_path, mode='wb') as f:
+            await f.write(payload) # Save the whole dict as UTF-8 bytes
+        os.replace(tmp_path, filepath)
         logger.info(f"Successfully saved raw data for {date_str} to {filepath}")
+        return True
     except IOError as e:
         logger.error(f"Error saving data for {date_str} to {filepath}.", exc_info=True)
+        return False
+
+async def fetch_and_save_for_day(session: aiohttp.ClientSession, request_semaphore: asyncio.Semaphore, date_to_process_str: str, state: dict, today_str: str, file_queue: Optional[asyncio.Queue] = None):
+    logger.info(f"Initiating fetch for date: {date_to_process_str}")
+    # The Federal Register API seems to cap per_page at 1000.
+    daily_data = await fetch_documents_for_date(session, request_semaphore, date_to_process_str, per_page=1000)
+    if not daily_data: # daily_data will always be a dict, check if it's not None
+        logger.warning(f"No data structure returned from fetch_documents_for_date for {date_to_process_str}")
+        return
+    complete = daily_data.pop("complete", False)
+    saved = await save_raw_data(date_to_process_str, daily_data)
+    if saved and file_queue is not None:
+        # Hand the file to the processor as soon as it is on disk
+        await file_queue.put(os.path.join(RAW_DATA_DIR, f"{date_to_process_str}.json"))
+
+    # Today's issue can still change, so only past dates are recorded as done
+    if not complete or date_to_process_str >= today_str:
+        return
+    if saved:
+        state[date_to_process_str] = STATE_COMPLETE
+    elif daily_data.get("count", 0) == 0:
+        state[date_to_process_str] = STATE_EMPTY
+    else:
+        return
+    save_json_state(STATE_FILE, state)
 
-async def main_downloader(days_to_fetch: int = 7):
+async def main_downloader(days_to_fetch: int = 7, force: bool = False, file_queue: Optional[asyncio.Queue] = None):
     """
     Main function to download data for the last N days.
     Each day's data is saved in a separate file.
+    Dates recorded in the state file as fully fetched are skipped unless `force` is set.
+    With `file_queue`, the path of each saved file is put on it as soon as it is written,
+    followed by None once the downloader is done (even if it fails).
     """
+    try:
+        await _download_days(days_to_fetch, force, file_queue)
+    finally:
+        if file_queue is not None:
+            await file_queue.put(None)
+
+async def _download_days(days_to_fetch: int, force: bool, file_queue: Optional[asyncio.Queue]):
     logger.info(f"Starting downloader to fetch data for the last {days_to_fetch} days.")
-    # Use a single ClientSession for all requests for efficiency
-    async with aiohttp.ClientSession() as session:
-        tasks = []
+    # Bounds in-flight API requests across all dates and pages
+    request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    # Use a single ClientSession for all requests so connections (and DNS lookups) are reused
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS, ttl_dns_cache=DNS_CACHE_TTL_SECONDS)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers={"User-Agent": USER_AGENT},
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+    ) as session:
         today = datetime.utcnow().date() # Use UTC for consistency
+        today_str = today.strftime("%Y-%m-%d")
+        state = load_json_state(STATE_FILE) # Unreadable state means refetching every requested date
 
+        tasks = []
         for i in range(days_to_fetch): # Fetches today, yesterday, day before, etc.
-            target_date_obj = today - timedelta(days=i)
-            target_date_str = target_date_obj.strftime("%Y-%m-%d")
-
-            # Create a task for fetching and saving for each day
-            async def fetch_and_save_for_day(date_to_process_str: str):
-                logger.info(f"Initiating fetch for date: {date_to_process_str}")
-                # Set per_page for individual date fetching if desired, e.g., 500 or 1000
-                # The Federal Register API seems to cap per_page at 1000.
-                daily_data = await fetch_documents_for_date(session, date_to_process_str, per_page=1000)
-                if daily_data: # daily_data will always be a dict, check if it's not None
-                    await save_raw_data(date_to_process_str, daily_data)
-                else:
-                    logger.warning(f"No data structure returned from fetch_documents_for_date for {date_to_process_str}")
-
-            tasks.append(fetch_and_save_for_day(target_date_str))
+            target_date_str = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+            if not force and is_already_fetched(state, target_date_str):
+                logger.info(f"Skipping {target_date_str}: already fetched.")
+                continue
+            tasks.append(fetch_and_save_for_day(session, request_semaphore, target_date_str, state, today_str, file_queue))
 
         # Run all date-fetching tasks concurrently
         await asyncio.gather(*tasks, return_exceptions=True) # return_exceptions=True to not stop all on one failure
@@ -137,5 +237,8 @@ if __name__ == "__main__":
         level=logging.INFO, # Set to DEBUG for more verbose output during testing
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
+    parser = argparse.ArgumentParser(description="Download Federal Register documents for recent days.")
+    parser.add_argument("--force", action="store_true", help="Refetch dates already recorded as fetched.")
+    args = parser.parse_args()
     # Example: Fetch data for the last 3 days
-    asyncio.run(main_downloader(days_to_fetch=3))
\ No newline at end of file
+    asyncio.run(main_downloader(days_to_fetch=3, force=args.force))
\ No newline at end of file
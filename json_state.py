@@ -0,0 +1,26 @@
+# json_state.py
+# Small JSON state files kept next to the raw data (downloader.py's per-date state,
+# processor.py's record of loaded files).
+import logging
+import os
+import orjson
+
+logger = logging.getLogger(__name__)
+
+def load_json_state(path: str) -> dict:
+    """Reads a state file, or returns an empty state if it is missing or unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except (OSError, orjson.JSONDecodeError):
+        logger.warning(f"Could not read {path}; starting from an empty state.", exc_info=True)
+        return {}
+
+def save_json_state(path: str, state: dict):
+    """Writes the state file atomically so an interrupted run never leaves it half-written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(state, option=orjson.OPT_SORT_KEYS))
+    os.replace(tmp_path, path)
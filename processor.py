@@ -1,44 +1,181 @@
 import asyncio
 import aiomysql
-import aiofiles
 import os
-import json
 import logging
+import tempfile
+import threading
+import orjson
+import xxhash
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
 
 # Assuming your config.py provides these
 from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, RAW_DATA_DIR
+from json_state import load_json_state, save_json_state
+
+try: # Optional: lazy parsing that only materializes the fields we insert
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try: # Optional: streaming parse of very large files
+    import ijson
+except ImportError:
+    ijson = None
 
 logger = logging.getLogger(__name__)
 
 TABLE_NAME = "latest_federal_documents"
+# Table db_tools.search_federal_documents reads from
+SEARCH_TABLE_NAME = "federal_documents"
+# Rows per executemany call. aiomysql rewrites each call into multi-row INSERT statements,
+# splitting them itself so no single statement exceeds its max_stmt_length (~1 MB, well
+# under the server's max_allowed_packet).
+BATCH_SIZE = 10000
+
+# Files at least this large are stream-parsed with ijson (if installed), so memory stays at
+# about one batch of documents instead of the whole file plus its parsed tree. Smaller files
+# are parsed in one go, which is much faster.
+STREAM_PARSE_MIN_BYTES = 64 * 1024 * 1024
+
+# Connections in the processor's pool, all opened up front (one per insert worker)
+POOL_SIZE = 16
+POOL_RECYCLE_SECONDS = 3600
+# Per-session settings for the load: skip secondary unique-index and foreign-key checks
+# (the primary key is still enforced, so upserts keep working)
+SESSION_INIT_SQL = "SET SESSION unique_checks=0, foreign_key_checks=0"
+
+# main_processor logs progress at INFO once per this many files; per-file and per-batch
+# messages are DEBUG
+PROGRESS_LOG_EVERY_FILES = 100
+
+# Parsed batches waiting for an insert worker. Small, so parsing runs at most a few
+# batches ahead of the database.
+PARSE_QUEUE_MAXSIZE = 4
+
+DOWNLOAD_STATE_FILENAME = "state.json" # downloader.py's per-date state, not a data file
+# Raw data files whose rows have all been committed, as file name -> st_mtime_ns of the copy
+# that was loaded. A file rewritten since (e.g. today's issue refetched) counts as not loaded.
+INGEST_STATE_FILENAME = "ingested.json"
+INGEST_STATE_FILE = os.path.join(RAW_DATA_DIR, INGEST_STATE_FILENAME)
 
 # Updated CREATE TABLE statement
+# Not partitioned by publication_date: every unique key would have to include
+# publication_date, so the upsert could no longer match a document by its id/document_number alone.
+# No search indexes here: searches read SEARCH_TABLE_NAME, so they would only slow every upsert.
 CREATE_TABLE_SQL = f"""
 CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-    document_number VARCHAR(255) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY, -- document_id(document_number)
+    document_number VARCHAR(255) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
     title TEXT,
     type VARCHAR(100),
     abstract TEXT,
     publication_date DATE,
-    html_url VARCHAR(1024),
-    pdf_url VARCHAR(1024),
-    public_inspection_pdf_url VARCHAR(1024),
+    html_url VARCHAR(1024) CHARACTER SET ascii COLLATE ascii_bin,
+    pdf_url VARCHAR(1024) CHARACTER SET ascii COLLATE ascii_bin,
+    public_inspection_pdf_url VARCHAR(1024) CHARACTER SET ascii COLLATE ascii_bin,
     agency_name VARCHAR(512),
-    excerpts TEXT
+    excerpts TEXT,
+    UNIQUE KEY uq_document_number (document_number)
 );
 """
 
+# Update INSERT SQL to include new columns
+# Make sure the number of %s matches the number of columns
+# and the order in VALUES matches the row tuples built by _rows_from_documents().
+# Built once and reused for every batch. aiomysql has no server-side prepared statements,
+# and executemany already turns each batch into a few multi-row INSERTs, so the statement
+# is parsed once per ~1 MB of rows rather than once per row.
+# Nothing (not even a comment) may sit between VALUES (...) and ON DUPLICATE KEY UPDATE,
+# or aiomysql can't rewrite executemany into multi-row INSERTs and runs one per row.
+INSERT_SQL = f"""
+INSERT INTO {TABLE_NAME} (
+    id, document_number, title, type, abstract, publication_date,
+    html_url, pdf_url, public_inspection_pdf_url, agency_name, excerpts
+)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    title = VALUES(title),
+    type = VALUES(type),
+    abstract = VALUES(abstract),
+    publication_date = VALUES(publication_date),
+    html_url = VALUES(html_url),
+    pdf_url = VALUES(pdf_url),
+    public_inspection_pdf_url = VALUES(public_inspection_pdf_url),
+    agency_name = VALUES(agency_name),
+    excerpts = VALUES(excerpts);
+"""
+
+# Bulk path for a cold (empty) table: each batch is written to a temporary TSV file and
+# loaded with LOAD DATA LOCAL INFILE, MySQL's fastest ingest path. REPLACE keeps the
+# upsert semantics should the same document appear in two files.
+LOAD_DATA_SQL = f"""
+LOAD DATA LOCAL INFILE %s
+REPLACE INTO TABLE {TABLE_NAME}
+CHARACTER SET utf8mb4
+FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+LINES TERMINATED BY '\\n'
+(
+    @id_hex, document_number, title, type, abstract, publication_date,
+    html_url, pdf_url, public_inspection_pdf_url, agency_name, excerpts
+)
+SET id = UNHEX(@id_hex)
+"""
+
+# Escapes for LOAD DATA's ESCAPED BY '\'; NULL is written as \N and binary ids as hex
+TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+# Flipped off the first time LOAD DATA LOCAL INFILE fails (e.g. local_infile is disabled
+# on the server), so later batches go straight to the INSERT path.
+_load_data_available = True
+
+# Document numbers and URLs are plain ASCII, so they are stored at one byte per character
+# instead of utf8mb4's up to four, which also shrinks the clustered index. Tables created
+# before this get the columns converted by ensure_ascii_columns().
+ASCII_COLUMNS = {
+    "document_number": "VARCHAR(255) CHARACTER SET ascii COLLATE ascii_bin NOT NULL",
+    "html_url": "VARCHAR(1024) CHARACTER SET ascii COLLATE ascii_bin",
+    "pdf_url": "VARCHAR(1024) CHARACTER SET ascii COLLATE ascii_bin",
+    "public_inspection_pdf_url": "VARCHAR(1024) CHARACTER SET ascii COLLATE ascii_bin",
+}
+
+# Tables created before the hashed primary key get it added by ensure_hashed_primary_key()
+ADD_ID_COLUMN_SQL = f"ALTER TABLE {TABLE_NAME} ADD COLUMN id BINARY(16) NULL FIRST"
+BACKFILL_ID_SQL = f"UPDATE {TABLE_NAME} SET id = %s WHERE document_number = %s"
+SWAP_PRIMARY_KEY_SQL = f"""
+ALTER TABLE {TABLE_NAME}
+    DROP PRIMARY KEY,
+    MODIFY COLUMN id BINARY(16) NOT NULL,
+    ADD PRIMARY KEY (id),
+    ADD UNIQUE KEY uq_document_number (document_number)
+"""
+
+# Indexes used by db_tools.search_federal_documents on SEARCH_TABLE_NAME, added by
+# ensure_search_indexes() where missing.
+SEARCH_INDEXES = {
+    "ft_kw": "ALTER TABLE {table} ADD FULLTEXT INDEX ft_kw (title, abstract, excerpts)",
+    "idx_type_pubdate": "ALTER TABLE {table} ADD INDEX idx_type_pubdate (type, publication_date)",
+}
+
 async def get_db_pool():
-    """Creates an aiomysql connection pool."""
+    """
+    Creates an aiomysql connection pool. With minsize == maxsize, create_pool opens every
+    connection before returning, so no insert worker pays a handshake mid-run.
+    Autocommit is off: each batch is committed explicitly, so the redo log is flushed once per
+    batch. For large backfills, innodb_flush_log_at_trx_commit=2 on the server cuts this further.
+    """
     try:
         pool = await aiomysql.create_pool(
             host=DB_HOST, port=DB_PORT,
             user=DB_USER, password=DB_PASSWORD,
-            db=DB_NAME, autocommit=True
+            db=DB_NAME, autocommit=False,
+            local_infile=True, # For the LOAD DATA bulk path on a cold table
+            minsize=POOL_SIZE, maxsize=POOL_SIZE,
+            pool_recycle=POOL_RECYCLE_SECONDS,
+            init_command=SESSION_INIT_SQL
         )
         return pool
     except Exception as e:
-        logging.error(f"Error creating database connection pool: {e}")
+        logger.error(f"Error creating database connection pool: {e}")
         raise
 
 async def create_table_if_not_exists(pool: aiomysql.Pool):
@@ -47,126 +184,427 @@ async def create_table_if_not_exists(pool: aiomysql.Pool):
         async with conn.cursor() as cur:
             try:
                 await cur.execute(CREATE_TABLE_SQL)
-                logging.info(f"Table '{TABLE_NAME}' ensured to exist.")
+                logger.info(f"Table '{TABLE_NAME}' ensured to exist.")
             except Exception as e:
-                logging.error(f"Error creating table '{TABLE_NAME}': {e}")
+                logger.error(f"Error creating table '{TABLE_NAME}': {e}")
                 raise
 
-async def process_file_and_insert(pool: aiomysql.Pool, filepath: str):
-    """Reads a JSON file, extracts data, and inserts/updates it into the database."""
-    try:
-        async with aiofiles.open(filepath, mode='r', encoding='utf-8') as f:
-            content = await f.read()
-            # The downloader now saves a structure like {"count": N, "results": [...]}
-            # So we need to access the 'results' list from the loaded JSON.
-            file_data_structure = json.loads(content)
-            documents_data = file_data_structure.get("results", [])
-    except Exception as e:
-        logging.error(f"Error reading or parsing JSON file {filepath}: {e}")
-        return 0
+async def ensure_search_indexes(pool: aiomysql.Pool, table_name: str = SEARCH_TABLE_NAME):
+    """
+    Adds any missing search indexes to an existing table (one-time migration).
+    A table that does not exist is skipped.
+    """
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT COUNT(*) FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                (table_name,)
+            )
+            (table_count,) = await cur.fetchone()
+            if not table_count:
+                logger.warning(f"Table '{table_name}' does not exist; skipping search indexes.")
+                await conn.commit()
+                return
+            await cur.execute(
+                "SELECT DISTINCT index_name FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                (table_name,)
+            )
+            existing_indexes = {row[0] for row in await cur.fetchall()}
+            for index_name, alter_sql in SEARCH_INDEXES.items():
+                if index_name in existing_indexes:
+                    continue
+                try:
+                    logger.info(f"Adding index '{index_name}' to table '{table_name}'.")
+                    await cur.execute(alter_sql.format(table=table_name))
+                except Exception as e:
+                    logger.error(f"Error adding index '{index_name}' to table '{table_name}': {e}")
+                    raise
+        # End the read transaction so the connection goes back to the pool idle
+        await conn.commit()
+
+async def ensure_ascii_columns(pool: aiomysql.Pool):
+    """Converts any ASCII_COLUMNS still in a multi-byte character set (one-time migration)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND character_set_name <> 'ascii'",
+                (TABLE_NAME,)
+            )
+            columns_to_convert = [row[0] for row in await cur.fetchall() if row[0] in ASCII_COLUMNS]
+            if columns_to_convert:
+                modify_clauses = ", ".join(f"MODIFY COLUMN {column} {ASCII_COLUMNS[column]}" for column in columns_to_convert)
+                try:
+                    logger.info(f"Converting columns {columns_to_convert} of table '{TABLE_NAME}' to ascii.")
+                    await cur.execute(f"ALTER TABLE {TABLE_NAME} {modify_clauses}")
+                except Exception as e:
+                    logger.error(f"Error converting columns of table '{TABLE_NAME}' to ascii: {e}")
+                    raise
+        # End the read transaction so the connection goes back to the pool idle
+        await conn.commit()
+
+async def ensure_hashed_primary_key(pool: aiomysql.Pool):
+    """
+    Moves a table keyed on document_number to the BINARY(16) id primary key (one-time
+    migration). Safe to re-run if interrupted: each step checks what is already done.
+    """
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT column_name, column_key FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'id'",
+                (TABLE_NAME,)
+            )
+            id_column = await cur.fetchone()
+            if id_column and id_column[1] == "PRI":
+                await conn.commit()
+                return
 
-    if not documents_data:
-        logging.info(f"No 'results' array found or it's empty in file {filepath}. Skipping.")
-        return 0
+            try:
+                logger.info(f"Migrating table '{TABLE_NAME}' to a hashed primary key.")
+                if not id_column:
+                    await cur.execute(ADD_ID_COLUMN_SQL)
+                await cur.execute(f"SELECT document_number FROM {TABLE_NAME} WHERE id IS NULL")
+                document_numbers = [row[0] for row in await cur.fetchall()]
+                for i in range(0, len(document_numbers), BATCH_SIZE):
+                    await cur.executemany(
+                        BACKFILL_ID_SQL,
+                        [(document_id(number), number) for number in document_numbers[i:i + BATCH_SIZE]]
+                    )
+                    await conn.commit()
+                await cur.execute(SWAP_PRIMARY_KEY_SQL)
+            except Exception as e:
+                await conn.rollback()
+                logger.error(f"Error migrating table '{TABLE_NAME}' to a hashed primary key: {e}")
+                raise
+        await conn.commit()
+
+def document_id(document_number: Optional[str]) -> Optional[bytes]:
+    """
+    Primary key for a document: the 16-byte xxh128 digest of its document number. Much smaller
+    than the VARCHAR(255) number itself, which every secondary index entry would carry.
+    Computed during parsing, in the executor threads.
+    """
+    if document_number is None:
+        return None
+    return xxhash.xxh128_digest(document_number.encode())
 
+# Document keys copied as-is into columns 3-9 of each row. Column 1 is document_id() of
+# column 2, the document number; column 10 is the first agency's raw_name and column 11
+# the excerpts (the INSERT_SQL column order).
+ROW_KEYS = (
+    "title", "type", "abstract", "publication_date",
+    "html_url", "pdf_url", "public_inspection_pdf_url"
+)
+
+# A pysimdjson Parser reuses its internal buffers across files but can hold only one parsed
+# document at a time, so each executor thread gets its own.
+_parser_local = threading.local()
+
+def _get_simdjson_parser() -> "simdjson.Parser":
+    parser = getattr(_parser_local, "parser", None)
+    if parser is None:
+        parser = _parser_local.parser = simdjson.Parser()
+    return parser
+
+def _rows_from_documents(documents_data: list) -> List[tuple]:
     documents_to_insert = []
+    append = documents_to_insert.append
     for doc in documents_data:
         # Safely get values, providing None if key is missing
-        # Extract agency name (first agency's raw_name)
-        first_agency_name = None
-        agencies_list = doc.get("agencies")
-        if agencies_list and isinstance(agencies_list, list) and len(agencies_list) > 0:
-            first_agency = agencies_list[0]
-            if isinstance(first_agency, dict):
-                first_agency_name = first_agency.get("raw_name")
+        doc_get = doc.get
+        # Extract agency name (first agency's raw_name); only malformed input takes the except path
+        try:
+            first_agency_name = doc["agencies"][0]["raw_name"]
+        except (KeyError, IndexError, TypeError):
+            first_agency_name = None
 
+        document_number = doc_get("document_number")
+        append((
+            document_id(document_number), document_number,
+            *map(doc_get, ROW_KEYS), first_agency_name, doc_get("excerpts")
+        ))
+    return documents_to_insert
+
+def _rows_from_simdjson(content: bytes) -> List[tuple]:
+    # Fields are read straight from simdjson's buffer; the other ~80% of each
+    # document's keys never become Python objects.
+    doc_tree = _get_simdjson_parser().parse(content)
+    documents_to_insert = []
+    for doc in doc_tree.get("results") or []:
+        try:
+            first_agency_name = doc.at_pointer("/agencies/0/raw_name")
+        except (KeyError, IndexError, TypeError, ValueError):
+            first_agency_name = None
+
+        document_number = doc.get("document_number")
         documents_to_insert.append((
-            doc.get("document_number"),          # 1
-            doc.get("title"),                    # 2
-            doc.get("type"),                     # 3
-            doc.get("abstract"),                 # 4
-            doc.get("publication_date"),         # 5
-            doc.get("html_url"),                 # 6
-            doc.get("pdf_url"),                  # 7
-            doc.get("public_inspection_pdf_url"),# 8
-            first_agency_name,                   # 9
-            doc.get("excerpts")                  # 10
+            document_id(document_number), document_number,
+            *map(doc.get, ROW_KEYS), first_agency_name, doc.get("excerpts")
         ))
+    # Only plain Python values escape, so doc_tree is released when this returns
+    return documents_to_insert
 
-    if not documents_to_insert:
-        logging.info(f"No valid documents to insert from {filepath} after parsing.")
-        return 0
-
-    # Update INSERT SQL to include new columns
-    # Make sure the number of %s matches the number of columns
-    # and the order in VALUES matches the tuple order above.
-    insert_sql = f"""
-    INSERT INTO {TABLE_NAME} (
-        document_number, title, type, abstract, publication_date,
-        html_url, pdf_url, public_inspection_pdf_url, agency_name, excerpts
-    )
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) -- 10 placeholders for 10 columns
-    ON DUPLICATE KEY UPDATE
-        title = VALUES(title),
-        type = VALUES(type),
-        abstract = VALUES(abstract),
-        publication_date = VALUES(publication_date),
-        html_url = VALUES(html_url),
-        pdf_url = VALUES(pdf_url),
-        public_inspection_pdf_url = VALUES(public_inspection_pdf_url),
-        agency_name = VALUES(agency_name),
-        excerpts = VALUES(excerpts);
+def extract_documents(content: bytes) -> List[tuple]:
+    """Parses a raw data file and returns one insert row per document in its 'results' array."""
+    if simdjson is not None:
+        return _rows_from_simdjson(content)
+    # The downloader now saves a structure like {"count": N, "results": [...]}
+    # So we need to access the 'results' list from the loaded JSON.
+    return _rows_from_documents(orjson.loads(content).get("results") or [])
+
+def _parse_file(filepath: str) -> List[tuple]:
+    # Read raw bytes: both parsers decode UTF-8 directly, skipping a separate str decode
+    with open(filepath, mode='rb') as f:
+        content = f.read()
+    return extract_documents(content)
+
+def _stream_row_batches(f: BinaryIO) -> Iterator[List[tuple]]:
+    """Yields insert rows in batches of BATCH_SIZE while ijson walks the file's 'results' array."""
+    batch = []
+    for doc in ijson.items(f, "results.item"):
+        batch.append(doc)
+        if len(batch) == BATCH_SIZE:
+            yield _rows_from_documents(batch)
+            batch = []
+    if batch:
+        yield _rows_from_documents(batch)
+
+async def _read_row_batches(filepath: str) -> AsyncIterator[List[tuple]]:
+    """Yields a file's insert rows in batches of at most BATCH_SIZE."""
+    loop = asyncio.get_running_loop()
+    if ijson is not None and os.path.getsize(filepath) >= STREAM_PARSE_MIN_BYTES:
+        with open(filepath, mode='rb') as f:
+            batches = _stream_row_batches(f)
+            # Each batch is parsed in a worker thread so the event loop keeps serving other files
+            while (batch := await loop.run_in_executor(None, next, batches, None)) is not None:
+                yield batch
+        return
+
+    # Read and parse in one worker-thread call: the blocking read and the CPU-bound parse
+    # both overlap the inserts awaiting MySQL
+    documents_to_insert = await loop.run_in_executor(None, _parse_file, filepath)
+    for i in range(0, len(documents_to_insert), BATCH_SIZE):
+        yield documents_to_insert[i:i + BATCH_SIZE]
+
+async def insert_rows(pool: aiomysql.Pool, filepath: str, documents_to_insert: List[tuple]) -> int:
     """
+    Inserts/updates one batch of rows from `filepath` in its own transaction. Returns the rows sent.
+    Raises (after rolling back) if the batch could not be written.
+    """
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            try:
+                # One transaction per batch, so the redo log is flushed once rather than per statement
+                await conn.begin()
+                await cur.executemany(INSERT_SQL, documents_to_insert)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            # For executemany with ON DUPLICATE KEY UPDATE, rowcount can be tricky.
+            # It's 1 for each new row inserted, 2 for each existing row updated.
+            # For simplicity, we'll just log that the operation was attempted.
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Attempted to insert/update {len(documents_to_insert)} records from {filepath}. DB affected rows: {cur.rowcount}.")
+    # The actual number of "processed" items is len(documents_to_insert)
+    return len(documents_to_insert)
+
+def _write_tsv(documents_to_insert: List[tuple]) -> str:
+    """Writes rows to a temporary TSV file in LOAD DATA's default format and returns its path."""
+    fd, tsv_path = tempfile.mkstemp(prefix="fedreg_", suffix=".tsv")
+    with os.fdopen(fd, mode='w', encoding='utf-8', newline='') as f:
+        for row in documents_to_insert:
+            f.write("\t".join(
+                "\\N" if value is None else value.hex() if isinstance(value, bytes) else str(value).translate(TSV_ESCAPES)
+                for value in row
+            ))
+            f.write("\n")
+    return tsv_path
 
-    inserted_count = 0
+async def load_rows(pool: aiomysql.Pool, filepath: str, documents_to_insert: List[tuple]) -> int:
+    """Bulk-loads one batch of rows from `filepath` with LOAD DATA LOCAL INFILE. Returns the rows sent."""
+    loop = asyncio.get_running_loop()
+    tsv_path = await loop.run_in_executor(None, _write_tsv, documents_to_insert)
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await conn.begin()
+                    await cur.execute(LOAD_DATA_SQL, (tsv_path,))
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Bulk-loaded {len(documents_to_insert)} records from {filepath}. DB affected rows: {cur.rowcount}.")
+    finally:
+        os.remove(tsv_path)
+    return len(documents_to_insert)
+
+async def write_rows(pool: aiomysql.Pool, filepath: str, documents_to_insert: List[tuple], cold_load: bool) -> int:
+    """Bulk-loads the batch into a table that was empty at start, otherwise upserts it."""
+    global _load_data_available
+
+    if cold_load and _load_data_available:
+        try:
+            return await load_rows(pool, filepath, documents_to_insert)
+        except Exception as e:
+            logger.warning(f"LOAD DATA LOCAL INFILE failed ({e}); falling back to INSERT for the rest of this run.")
+            _load_data_available = False
+    return await insert_rows(pool, filepath, documents_to_insert)
+
+async def table_is_empty(pool: aiomysql.Pool) -> bool:
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
+            await cur.execute(f"SELECT 1 FROM {TABLE_NAME} LIMIT 1")
+            is_empty = await cur.fetchone() is None
+        # End the read transaction so the connection goes back to the pool idle
+        await conn.commit()
+    return is_empty
+
+def is_ingested(ingest_state: Dict[str, int], filepath: str) -> bool:
+    try:
+        return ingest_state.get(os.path.basename(filepath)) == os.stat(filepath).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def list_raw_files() -> List[str]:
+    """Returns the paths of the raw data files in RAW_DATA_DIR (not the state files)."""
+    # DirEntry objects already carry the full path and file type, so no join or stat per file
+    with os.scandir(RAW_DATA_DIR) as entries:
+        return [
+            entry.path for entry in entries
+            if entry.name.endswith('.json')
+            and entry.name not in (DOWNLOAD_STATE_FILENAME, INGEST_STATE_FILENAME)
+            and entry.is_file()
+        ]
+
+async def _iter_paths(paths: List[str]) -> AsyncIterator[str]:
+    for path in paths:
+        yield path
+
+async def _iter_file_queue(file_queue: asyncio.Queue, backlog: List[str]) -> AsyncIterator[str]:
+    """Yields the `backlog` paths, then file paths put on `file_queue` until it receives None."""
+    for path in backlog:
+        yield path
+    while (path := await file_queue.get()) is not None:
+        yield path
+
+async def produce_row_batches(raw_files: AsyncIterator[str], queue: asyncio.Queue, num_consumers: int, parsed_files: Dict[str, int]):
+    """
+    Parses each file (by path) and queues its row batches, then one None per consumer to stop them.
+    Records each file read to the end in `parsed_files`, with the st_mtime_ns it was read at.
+    """
+    log_debug = logger.isEnabledFor(logging.DEBUG)
+    files_done = 0
+    seen = set()
+    try:
+        async for filepath in raw_files:
             try:
-                await cur.executemany(insert_sql, documents_to_insert)
-                # For executemany with ON DUPLICATE KEY UPDATE, rowcount can be tricky.
-                # It's 1 for each new row inserted, 2 for each existing row updated.
-                # For simplicity, we'll just log that the operation was attempted.
-                logging.info(f"Attempted to insert/update {len(documents_to_insert)} records from {filepath}. DB affected rows: {cur.rowcount}.")
-                # The actual number of "processed" items is len(documents_to_insert)
-                inserted_count = len(documents_to_insert)
+                mtime_ns = os.stat(filepath).st_mtime_ns
+                # A file can be both in the backlog and handed over by the downloader
+                if (filepath, mtime_ns) in seen:
+                    continue
+                seen.add((filepath, mtime_ns))
+                if files_done and files_done % PROGRESS_LOG_EVERY_FILES == 0:
+                    logger.info(f"Parsed {files_done} raw data files.")
+                files_done += 1
+                if log_debug:
+                    logger.debug(f"Processing file: {filepath}")
+                found_rows = False
+                async for documents_to_insert in _read_row_batches(filepath):
+                    found_rows = True
+                    await queue.put((filepath, documents_to_insert))
+                if not found_rows:
+                    if log_debug:
+                        logger.debug(f"No 'results' array found or it's empty in file {filepath}. Skipping.")
+                parsed_files[filepath] = mtime_ns
             except Exception as e:
-                logging.error(f"Error inserting data from {filepath}: {e}")
-    return inserted_count
+                logger.error(f"Error reading or parsing JSON file {filepath}: {e}")
+    finally:
+        for _ in range(num_consumers):
+            await queue.put(None)
 
-async def main_processor():
-    """Main function to process all raw data files and insert into DB."""
+async def consume_row_batches(pool: aiomysql.Pool, queue: asyncio.Queue, docs_per_file: Dict[str, int], failed_files: set, cold_load: bool):
+    """Writes queued row batches until it receives None. Records files with a failed batch in `failed_files`."""
+    while True:
+        item: Optional[Tuple[str, List[tuple]]] = await queue.get()
+        if item is None:
+            return
+        filepath, documents_to_insert = item
+        try:
+            num_docs = await write_rows(pool, filepath, documents_to_insert, cold_load)
+            docs_per_file[filepath] = docs_per_file.get(filepath, 0) + num_docs
+        except Exception as e:
+            failed_files.add(filepath)
+            logger.error(f"Error writing rows from {filepath}: {e}")
+
+async def main_processor(file_queue: Optional[asyncio.Queue] = None):
+    """
+    Main function to process all raw data files and insert into DB.
+    With `file_queue` (fed by main_downloader), first processes the raw data files in RAW_DATA_DIR
+    not yet loaded by any run, then the file paths put on the queue, as they arrive, until None;
+    otherwise processes every raw data file already in RAW_DATA_DIR.
+    A file is recorded as loaded only once every one of its batches has been committed.
+    """
     pool = await get_db_pool()
     if not pool:
         return
 
     await create_table_if_not_exists(pool)
+    await ensure_search_indexes(pool, SEARCH_TABLE_NAME)
+    await ensure_ascii_columns(pool)
+    await ensure_hashed_primary_key(pool)
 
-    total_docs_processed = 0
-    files_processed_count = 0
-
-    raw_files = [f for f in os.listdir(RAW_DATA_DIR) if f.endswith('.json')]
-    if not raw_files:
-        logging.info("No raw data files found to process.")
+    ingest_state = load_json_state(INGEST_STATE_FILE) # Unreadable state means every file counts as not loaded
+    if file_queue is not None:
+        # Files the downloader saved in earlier runs whose load failed or never ran (it only
+        # hands over the dates it fetches now)
+        backlog = [path for path in list_raw_files() if not is_ingested(ingest_state, path)]
+        if backlog:
+            logger.info(f"Found {len(backlog)} raw data files not yet loaded; processing them first.")
+        raw_files = _iter_file_queue(file_queue, backlog)
     else:
-        logging.info(f"Found {len(raw_files)} raw data files to process.")
+        raw_file_paths = list_raw_files()
+        if not raw_file_paths:
+            logger.info("No raw data files found to process.")
+        else:
+            logger.info(f"Found {len(raw_file_paths)} raw data files to process.")
+        raw_files = _iter_paths(raw_file_paths)
 
-    # Process files one by one to make logging clearer if one fails
-    for filename in raw_files:
-        filepath = os.path.join(RAW_DATA_DIR, filename)
-        logging.info(f"Processing file: {filepath}")
-        try:
-            num_docs_in_file = await process_file_and_insert(pool, filepath)
-            if num_docs_in_file > 0:
-                total_docs_processed += num_docs_in_file
-                files_processed_count +=1 # Count file if it had processable docs
-        except Exception as e:
-            logging.error(f"Critical error processing file {filename}: {e}")
+    cold_load = await table_is_empty(pool)
+    if cold_load:
+        logger.info(f"Table '{TABLE_NAME}' is empty; bulk-loading with LOAD DATA LOCAL INFILE.")
 
+    # Pipeline: one task parses files (in worker threads) while one insert worker per
+    # pooled connection writes the batches already parsed
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PARSE_QUEUE_MAXSIZE)
+    docs_per_file: Dict[str, int] = {}
+    parsed_files: Dict[str, int] = {}
+    failed_files = set()
+    num_consumers = pool.maxsize
+    await asyncio.gather(
+        produce_row_batches(raw_files, queue, num_consumers, parsed_files),
+        *(consume_row_batches(pool, queue, docs_per_file, failed_files, cold_load) for _ in range(num_consumers))
+    )
+
+    ingest_state.update(
+        (os.path.basename(filepath), mtime_ns)
+        for filepath, mtime_ns in parsed_files.items() if filepath not in failed_files
+    )
+    save_json_state(INGEST_STATE_FILE, ingest_state)
+    if failed_files:
+        logger.warning(f"{len(failed_files)} raw data files were not fully loaded; they will be retried on the next run.")
 
-    logging.info(f"Processor finished. Successfully processed data for {total_docs_processed} documents from {files_processed_count} files.")
+    total_docs_processed = sum(docs_per_file.values())
+    files_processed_count = sum(1 for num_docs in docs_per_file.values() if num_docs > 0) # Count file if it had processable docs
+    logger.info(f"Processor finished. Successfully processed data for {total_docs_processed} documents from {files_processed_count} files.")
     pool.close()
     await pool.wait_closed()
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     asyncio.run(main_processor())
\ No newline at end of file
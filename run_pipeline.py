@@ -14,20 +14,25 @@ logger = logging.getLogger(__name__)
 async def run_full_pipeline():
     logger.info("Starting data pipeline...") # Use logger instance
 
-    logger.info("Running downloader...")
-    try:
-        await main_downloader()
+    # The processor ingests each day's file as soon as the downloader has written it,
+    # so downloading and database loading overlap instead of running back to back
+    logger.info("Running downloader and processor...")
+    file_queue: asyncio.Queue = asyncio.Queue()
+    downloader_result, processor_result = await asyncio.gather(
+        main_downloader(file_queue=file_queue),
+        main_processor(file_queue=file_queue),
+        return_exceptions=True
+    )
+
+    if isinstance(downloader_result, Exception):
+        logger.error(f"Downloader failed: {downloader_result}", exc_info=downloader_result) # Add exc_info for traceback
+    else:
         logger.info("Downloader completed.")
-    except Exception as e:
-        logger.error(f"Downloader failed: {e}", exc_info=True) # Add exc_info for traceback
-        return
-
-    logger.info("Running processor...")
-    try:
-        await main_processor()
+    if isinstance(processor_result, Exception):
+        logger.error(f"Processor failed: {processor_result}", exc_info=processor_result) # Add exc_info
+    else:
         logger.info("Processor completed.")
-    except Exception as e:
-        logger.error(f"Processor failed: {e}", exc_info=True) # Add exc_info
+    if isinstance(downloader_result, Exception) or isinstance(processor_result, Exception):
         return
 
     logger.info("Data pipeline finished successfully.")